@@ -28,17 +28,44 @@ This Python script automates the backup process for WordPress websites. It perfo
 This script is intended for use by WordPress site administrators who need an automated, reliable backup solution with remote storage capabilities.
 """
 
+import io
 import os
+import ssl
+import json
+import socket
+import time
+import zlib
+import hashlib
+import logging
+import logging.handlers
 import zipfile
+import queue
 import shutil
+import tempfile
+import threading
 import subprocess
-from ftplib import FTP
-from datetime import datetime, timedelta
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from ftplib import FTP, error_perm
+from datetime import datetime, timedelta, timezone
+
+try:
+    import paramiko
+except ImportError:
+    paramiko = None  # Only needed for the 'sftp' protocol
+
+try:
+    import libarchive
+except (ImportError, OSError):
+    libarchive = None  # Only needed when use_libarchive is set
 
 # Configuration variables
 wp_directory = '/path/to/wordpress'
 backup_directory = '/path/to/backup'
 log_file = os.path.join(backup_directory, 'backup_log.txt')
+archive_format = 'zip'  # Archive format for backups: 'zip', or 'tar.zst' for a multithreaded zstd-compressed tar
+use_libarchive = False  # Write the archive with libarchive (requires the libarchive-c package) instead of zipfile or tar
 database_config = {
     'host': 'localhost',
     'user': 'your_db_user',
@@ -46,133 +73,1133 @@ database_config = {
     'database': 'your_db_name'
 }
 ftp_config = {
+    'protocol': 'ftp',  # 'ftp', or 'sftp' to upload over SSH (requires the paramiko package)
+    'host_key': '',  # SFTP server host key as '<key type> <base64 key>', or '' to look it up in ~/.ssh/known_hosts
     'host': 'ftp.example.com',
     'user': 'ftp_user',
     'password': 'ftp_password',
     'remote_dir': '/remote/backup/directory',
-    'keep_days': 3  # Number of days to keep backups on FTP, set to 0 to disable deletion
+    'keep_days': 3,  # Number of days to keep backups on FTP, set to 0 to disable deletion
+    'streams': 4,  # Number of parallel FTP connections used to upload large backups, set to 1 to disable
+    'full_backup_days': 7,  # Days between full backups, other runs upload only changed files; set to 0 to always upload a full backup
+    'pipeline': False,  # Upload the backup while it is being written; backups are then always sent over a single connection
+    'send_buffer_size': 0  # Send buffer in bytes for FTP data connections, 0 to leave it to the kernel's autotuning
+}
+
+# File name extension of the backup archive for each archive format.
+BACKUP_EXTENSIONS = {
+    'zip': '.zip',
+    'tar.zst': '.tar.zst'
 }
 
+# Already-compressed file types are stored in the zip as-is rather than deflated again.
+STORED_EXTENSIONS = frozenset({
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.avif', '.ico',
+    '.mp3', '.mp4', '.m4a', '.mov', '.webm', '.ogg',
+    '.zip', '.gz', '.tgz', '.bz2', '.xz', '.zst', '.7z', '.rar',
+    '.woff', '.woff2', '.pdf'
+})
+
+# Files up to this size are deflated in parallel worker processes; larger files are
+# streamed into the zip by the main process so they are never held in memory whole.
+PARALLEL_DEFLATE_MAX_SIZE = 16 * 1024 * 1024
+
+# Read size used when the main process copies a file into the archive. `ZipFile.write`
+# copies in 8 KiB blocks, which costs a syscall pair every 8 KiB on large media files.
+COPY_BUFSIZE = 16 * 1024 * 1024
+
+# Block size used when a file has to be sent to the FTP server through Python.
+FTP_BLOCKSIZE = 1024 * 1024
+
+# Backups are only split across parallel FTP connections into parts of at least this size.
+FTP_MIN_PART_SIZE = 64 * 1024 * 1024
+
+# Old backups are deleted over this many parallel FTP connections when there are more
+# of them than connections, so retention is not one round trip per file.
+FTP_DELETE_CONNECTIONS = 4
+
+# Number of FTP_BLOCKSIZE blocks a pipelined upload may fall behind the archive writer
+# before the writer is made to wait.
+PIPELINE_QUEUE_SIZE = 8
+
+# Suffix of the temporary name a pipelined upload or backup part is stored under until it is complete.
+UPLOAD_TEMP_SUFFIX = '.uploading'
+
+# SSH flow control window and packet size for SFTP uploads. Paramiko's default 2 MiB
+# window stalls a single upload on any link with real latency.
+SFTP_WINDOW_SIZE = 256 * 1024 * 1024
+SFTP_MAX_PACKET_SIZE = 32768
+
+# File on the FTP server recording the SHA-1 of every site file in the latest backup.
+MANIFEST_NAME = 'manifest.json'
+
+class _LogFormatter(logging.Formatter):
+    """
+    Log formatter that formats the timestamp once per second rather than once per message.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._last_second = None
+        self._last_time = ''
+    
+    def formatTime(self, record, datefmt=None):
+        second = int(record.created)
+        if second != self._last_second:
+            self._last_time = super().formatTime(record, datefmt)
+            self._last_second = second
+        return self._last_time
+
+# The log file is opened on the first message and kept open for the rest of the run.
+logger = logging.getLogger('wpbackup')
+log_handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=10_000_000, backupCount=3, delay=True)
+log_handler.setFormatter(_LogFormatter('%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+logger.addHandler(log_handler)
+logger.setLevel(logging.INFO)
+
 def log_message(message):
     """
     Logs a message with a timestamp to the log file.
     
     :param message: Message to be logged.
     """
-    with open(log_file, 'a') as log:
-        log.write(f"{datetime.now().strftime('%Y-%m-%d %H:%M:%S')} - {message}\n")
+    logger.info(message)
 
 def delete_yesterdays_backup():
     """
     Deletes the backup file from yesterday based on the file name.
     
     - The backup file name includes the date in the format 'YYYYMMDD'.
-    - Only yesterday's backup will be deleted, ensuring that only the current backup is stored.
+    - Only yesterday's backups will be deleted, the full backup and every incremental backup
+      made that day, ensuring that only the current backup is stored.
     """
     yesterday = datetime.now() - timedelta(days=1)
     yesterday_str = yesterday.strftime('%Y%m%d')
-    backup_to_delete = f'wordpress_backup_{yesterday_str}.zip'
+    deleted = False
     
-    backup_file_path = os.path.join(backup_directory, backup_to_delete)
+    for extension in BACKUP_EXTENSIONS.values():
+        for backup_to_delete in sorted(os.listdir(backup_directory)):
+            if (backup_to_delete == f'wordpress_backup_{yesterday_str}{extension}'
+                    or (backup_to_delete.startswith(f'wordpress_backup_{yesterday_str}_')
+                        and backup_to_delete.endswith(f'.delta{extension}'))):
+                os.remove(os.path.join(backup_directory, backup_to_delete))
+                log_message(f"Deleted yesterday's backup file: {backup_to_delete}")
+                deleted = True
     
-    if os.path.exists(backup_file_path):
-        os.remove(backup_file_path)
-        log_message(f"Deleted yesterday's backup file: {backup_to_delete}")
-    else:
+    if not deleted:
         log_message("No backup found to delete for yesterday.")
 
-def backup_site():
+def _advise_sequential(f):
     """
-    Backup the WordPress site files and MySQL database.
+    Tell the kernel that an open file will be read once from start to end, so it reads ahead.
     
-    - Copies the WordPress directory to a specified backup directory.
-    - Creates a SQL dump of the MySQL database using `mysqldump`.
-    - Creates separate directories for site data and database within the backup directory.
+    :param f: Open file object.
     """
-    log_message("Starting backup process.")
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+def _drop_cache(f):
+    """
+    Tell the kernel that an open file's cached pages are no longer needed.
     
-    site_backup_dir = os.path.join(backup_directory, 'site_data')
-    db_backup_dir = os.path.join(backup_directory, 'database')
-    os.makedirs(site_backup_dir, exist_ok=True)
-    os.makedirs(db_backup_dir, exist_ok=True)
+    - Reading the whole site for a backup would otherwise evict the pages the live site and
+      MySQL rely on from the page cache.
+    
+    :param f: Open file object.
+    """
+    if hasattr(os, 'posix_fadvise'):
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+def _hash_file(path):
+    """
+    Compute the SHA-1 digest of a file in a worker process.
+    
+    :param path: Path of the file to hash.
+    :return: Hex digest of the file's contents.
+    """
+    with open(path, 'rb') as f:
+        _advise_sequential(f)
+        if hasattr(hashlib, 'file_digest'):
+            digest = hashlib.file_digest(f, 'sha1')
+        else:
+            digest = hashlib.sha1()
+            for buf in iter(lambda: f.read(1 << 20), b''):
+                digest.update(buf)
+        _drop_cache(f)
+    return digest.hexdigest()
+
+def _scan_files(directory):
+    """
+    Walk a directory tree with `os.scandir`, yielding every file below it.
+    
+    - Like `os.walk`, symbolic links to directories are not followed.
+    - Entries are yielded in sorted order, so the same tree always produces the same archive
+      and files from one directory sit next to each other.
+    
+    :param directory: Directory to walk.
+    :return: Generator of (path, os.stat_result) tuples.
+    """
+    stack = [directory]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+        subdirs = []
+        for entry in entries:
+            if entry.is_dir():
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+            else:
+                yield entry.path, entry.stat()
+        stack.extend(reversed(subdirs))
+
+def _zipinfo_from_stat(arcname, st):
+    """
+    Build a zip entry for a file from an existing stat result, without statting it again.
+    
+    - The entry's timestamp is the file's modification time, clamped to the 1980 to 2107
+      range the zip format can store.
+    
+    :param arcname: Name of the entry in the zip file.
+    :param st: os.stat_result of the file.
+    :return: zipfile.ZipInfo describing the file.
+    """
+    date_time = time.localtime(st.st_mtime)[:6]
+    if date_time[0] < 1980:
+        date_time = (1980, 1, 1, 0, 0, 0)
+    elif date_time[0] > 2107:
+        date_time = (2107, 12, 31, 23, 59, 59)
+    zinfo = zipfile.ZipInfo(arcname, date_time)
+    zinfo.external_attr = (st.st_mode & 0xFFFF) << 16
+    zinfo.file_size = st.st_size
+    return zinfo
+
+def _deflate_file(path):
+    """
+    Deflate a file's contents in a worker process, hashing it in the same pass.
+    
+    :param path: Path of the file to compress.
+    :return: Tuple of (CRC-32, uncompressed size, raw deflate data, SHA-1 hex digest).
+    """
+    compressor = zlib.compressobj(1, zlib.DEFLATED, -15)
+    digest = hashlib.sha1()
+    crc = 0
+    size = 0
+    chunks = []
+    with open(path, 'rb') as f:
+        _advise_sequential(f)
+        while True:
+            buf = f.read(1 << 20)
+            if not buf:
+                break
+            digest.update(buf)
+            crc = zlib.crc32(buf, crc)
+            size += len(buf)
+            chunks.append(compressor.compress(buf))
+        _drop_cache(f)
+    chunks.append(compressor.flush())
+    return crc, size, b''.join(chunks), digest.hexdigest()
 
-    # Copy WordPress files to the site_data backup directory.
-    shutil.copytree(wp_directory, site_backup_dir, dirs_exist_ok=True)
-    log_message("WordPress files copied successfully.")
+def _write_deflated(backup_zip, zinfo, crc, file_size, data):
+    """
+    Write an entry that has already been deflated into the zip file.
+    
+    - `ZipFile` has no public API for pre-compressed data, so the local header and data
+      are written directly and the entry is registered for the central directory.
+    
+    :param backup_zip: Open zipfile.ZipFile being written.
+    :param zinfo: zipfile.ZipInfo describing the entry.
+    :param crc: CRC-32 of the uncompressed data.
+    :param file_size: Size of the uncompressed data.
+    :param data: Raw deflate data.
+    """
+    zinfo.compress_type = zipfile.ZIP_DEFLATED
+    zinfo.CRC = crc
+    zinfo.file_size = file_size
+    zinfo.compress_size = len(data)
     
-    # Create a SQL dump of the MySQL database.
-    backup_file = os.path.join(db_backup_dir, 'database_backup.sql')
+    backup_zip._writecheck(zinfo)
+    backup_zip._didModify = True
+    zinfo.header_offset = backup_zip.fp.tell()
+    backup_zip.fp.write(zinfo.FileHeader())
+    backup_zip.fp.write(data)
+    backup_zip.start_dir = backup_zip.fp.tell()
+    backup_zip.filelist.append(zinfo)
+    backup_zip.NameToInfo[zinfo.filename] = zinfo
+
+def _add_file(backup_zip, path, zinfo, compress_type):
+    """
+    Copy a file into the zip file from the main process in `COPY_BUFSIZE` blocks, hashing it in the same pass.
+    
+    :param backup_zip: Open zipfile.ZipFile being written.
+    :param path: Path of the file on disk.
+    :param zinfo: zipfile.ZipInfo describing the entry.
+    :param compress_type: zipfile compression method for the entry.
+    :return: SHA-1 hex digest of the file's contents.
+    """
+    zinfo.compress_type = compress_type
+    zinfo._compresslevel = backup_zip.compresslevel
+    digest = hashlib.sha1()
+    # The size from the scan is only an estimate for files still being written to, so ZIP64
+    # headers are always used; a streamed zip cannot patch the local header afterwards.
+    with open(path, 'rb') as src, backup_zip.open(zinfo, 'w', force_zip64=True) as dest:
+        _advise_sequential(src)
+        while True:
+            buf = src.read(COPY_BUFSIZE)
+            if not buf:
+                break
+            digest.update(buf)
+            dest.write(buf)
+        _drop_cache(src)
+    return digest.hexdigest()
+
+def _write_entry(backup_zip, path, zinfo, future):
+    """
+    Write a single site file into the zip file.
+    
+    :param backup_zip: Open zipfile.ZipFile being written.
+    :param path: Path of the file on disk.
+    :param zinfo: zipfile.ZipInfo describing the entry.
+    :param future: Future for the file's parallel deflate, or None to write it from the main process.
+    :return: SHA-1 hex digest of the file's contents.
+    """
+    if future is not None:
+        crc, file_size, data, digest = future.result()
+        _write_deflated(backup_zip, zinfo, crc, file_size, data)
+        return digest
+    elif os.path.splitext(path)[1].lower() in STORED_EXTENSIONS:
+        # Deflating media that is already compressed only costs CPU time.
+        return _add_file(backup_zip, path, zinfo, zipfile.ZIP_STORED)
+    else:
+        return _add_file(backup_zip, path, zinfo, zipfile.ZIP_DEFLATED)
+
+def dump_database(dest):
+    """
+    Stream a compressed SQL dump of the MySQL database into a file.
+    
+    - Runs `mysqldump` in a single transaction so tables are not locked while the site is live.
+    - Pipes the dump through `gzip -1` straight into the destination, so no uncompressed SQL file is written to disk.
+    
+    :param dest: Writable binary file object the gzipped dump will be written to.
+    """
     dump_command = [
         'mysqldump',
         '-h', database_config['host'],
         '-u', database_config['user'],
         f"--password={database_config['password']}",
-        database_config['database'],
-        '--result-file', backup_file
+        '--single-transaction',
+        '--quick',
+        '--compress',
+        database_config['database']
     ]
     
-    try:
-        subprocess.run(dump_command, check=True)
+    dump_proc = subprocess.Popen(dump_command, stdout=subprocess.PIPE)
+    gzip_proc = subprocess.Popen(['gzip', '-1'], stdin=dump_proc.stdout, stdout=subprocess.PIPE)
+    # Only gzip should hold the read end, so mysqldump sees a broken pipe if gzip exits early.
+    dump_proc.stdout.close()
+    
+    shutil.copyfileobj(gzip_proc.stdout, dest, length=1 << 20)
+    gzip_proc.stdout.close()
+    
+    dump_status = dump_proc.wait()
+    gzip_status = gzip_proc.wait()
+    if dump_status != 0:
+        log_message(f"Error during database dump: mysqldump exited with status {dump_status}")
+    elif gzip_status != 0:
+        log_message(f"Error during database dump: gzip exited with status {gzip_status}")
+    else:
         log_message("Database SQL dump completed successfully.")
-    except subprocess.CalledProcessError as e:
-        log_message(f"Error during database dump: {e}")
 
-def zip_backup():
+def zip_backup(out, changed, deleted, pool):
     """
-    Zip the backup directories into a single file.
+    Write the backup into a zip file.
     
-    - Compresses the site_data and database directories into a single zip file.
-    - The zip file is created in the specified backup directory with a timestamped filename.
+    - Compresses the site files into the zip file under 'site_data/', reading the files in place.
+    - Uses fast deflate compression, storing already-compressed media files as-is.
+    - Deflates files in parallel across the worker processes of `pool`.
+    - Hashes each file while compressing it, so every file is read only once.
+    - Streams a gzipped SQL dump of the MySQL database into the zip file as 'database/database_backup.sql.gz'.
+    
+    :param out: Writable binary file object for the zip file, which need not be seekable.
+    :param changed: List of (path, zipfile.ZipInfo) tuples for the site files to add.
+    :param deleted: List of site file arcnames removed since the previous backup.
+    :param pool: ProcessPoolExecutor used to deflate files.
+    :return: Dictionary of SHA-1 hex digests of the added site files, keyed by arcname.
     """
-    date_str = datetime.now().strftime('%Y%m%d')
-    zip_file = os.path.join(backup_directory, f'wordpress_backup_{date_str}.zip')
+    digests = {}
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED, compresslevel=1,
+                         allowZip64=True) as backup_zip:
+        # Entries are written in walk order; only a bounded window of files is in
+        # flight so compressed data does not pile up in memory.
+        window = (os.cpu_count() or 1) * 4
+        pending = deque()
+        for path, zinfo in changed:
+            future = None
+            if (zinfo.file_size <= PARALLEL_DEFLATE_MAX_SIZE
+                    and os.path.splitext(path)[1].lower() not in STORED_EXTENSIONS):
+                future = pool.submit(_deflate_file, path)
+            pending.append((path, zinfo, future))
+            if len(pending) >= window:
+                entry = pending.popleft()
+                digests[entry[1].filename] = _write_entry(backup_zip, *entry)
+        while pending:
+            entry = pending.popleft()
+            digests[entry[1].filename] = _write_entry(backup_zip, *entry)
+        if deleted:
+            backup_zip.writestr('deleted_files.txt', '\n'.join(deleted) + '\n')
+        
+        # The dump is already gzipped, so it is stored in the zip without further compression.
+        zinfo = zipfile.ZipInfo('database/database_backup.sql.gz', date_time=datetime.now().timetuple()[:6])
+        zinfo.compress_type = zipfile.ZIP_STORED
+        zinfo.external_attr = 0o600 << 16
+        with backup_zip.open(zinfo, 'w', force_zip64=True) as zentry:
+            dump_database(zentry)
+    log_message(f"Backup zipped successfully: {out.name}")
+    return digests
 
-    with zipfile.ZipFile(zip_file, 'w') as backup_zip:
-        for root, dirs, files in os.walk(os.path.join(backup_directory, 'site_data')):
-            for file in files:
-                backup_zip.write(os.path.join(root, file),
-                                 os.path.relpath(os.path.join(root, file),
-                                                 os.path.join(backup_directory, 'site_data')))
-        for root, dirs, files in os.walk(os.path.join(backup_directory, 'database')):
-            for file in files:
-                backup_zip.write(os.path.join(root, file),
-                                 os.path.relpath(os.path.join(root, file),
-                                                 os.path.join(backup_directory, 'database')))
-    log_message(f"Backup zipped successfully: {zip_file}")
+def tar_backup(out, changed, deleted):
+    """
+    Write the backup into a zstd-compressed tar file.
+    
+    - Runs `tar` with `zstd -T0 --long`, compressing across file boundaries on every CPU core.
+    - Uses the same 'site_data/' and 'database/' layout as the zip file.
+    - The gzipped SQL dump and the deleted file list are staged in a temporary directory first,
+      because tar needs to know the size of every member before writing it.
+    - Raises RuntimeError if tar fails, so neither the archive nor the manifest is uploaded;
+      files that changed while being read (tar status 1) are only logged.
+    
+    :param out: Writable binary file object for the tar file.
+    :param changed: List of (path, zipfile.ZipInfo) tuples for the site files to add.
+    :param deleted: List of site file arcnames removed since the previous backup.
+    """
+    staging_dir = tempfile.mkdtemp(dir=backup_directory)
+    try:
+        # Site files are read in place through a 'site_data' symlink to the WordPress directory.
+        os.symlink(os.path.abspath(wp_directory), os.path.join(staging_dir, 'site_data'))
+        members = [zinfo.filename for path, zinfo in changed]
+        if deleted:
+            with open(os.path.join(staging_dir, 'deleted_files.txt'), 'w') as f:
+                f.write('\n'.join(deleted) + '\n')
+            members.append('deleted_files.txt')
+        os.makedirs(os.path.join(staging_dir, 'database'))
+        with open(os.path.join(staging_dir, 'database', 'database_backup.sql.gz'), 'wb') as f:
+            dump_database(f)
+        members.append('database/database_backup.sql.gz')
+        
+        # The member list and tar's messages go through files, so neither pipe can fill up
+        # while the archive is being read from tar's output.
+        members_file = os.path.join(staging_dir, 'members')
+        with open(members_file, 'wb') as f:
+            f.write(b'\0'.join(os.fsencode(m) for m in members))
+        tar_command = [
+            'tar', '--create',
+            '--file', '-',
+            '--use-compress-program', 'zstd -T0 --long',
+            '--directory', staging_dir,
+            '--no-recursion', '--null', '--files-from', members_file
+        ]
+        with tempfile.TemporaryFile(dir=staging_dir) as tar_errors:
+            if hasattr(out, 'fileno'):
+                # A real file can be handed straight to tar.
+                out.flush()
+                tar_proc = subprocess.Popen(tar_command, stdout=out, stderr=tar_errors)
+            else:
+                tar_proc = subprocess.Popen(tar_command, stdout=subprocess.PIPE, stderr=tar_errors)
+                shutil.copyfileobj(tar_proc.stdout, out, FTP_BLOCKSIZE)
+                tar_proc.stdout.close()
+            
+            tar_proc.wait()
+            tar_errors.seek(0)
+            messages = tar_errors.read().decode(errors='replace').strip()
+            if tar_proc.returncode == 0:
+                log_message(f"Backup archived successfully: {out.name}")
+            elif tar_proc.returncode == 1:
+                # Status 1 only means some files changed while they were being read.
+                log_message(f"Backup archived with warnings: {out.name}\n{messages}")
+            else:
+                log_message(f"Error during tar backup: tar exited with status {tar_proc.returncode}\n{messages}")
+                raise RuntimeError(f"tar exited with status {tar_proc.returncode}")
+    finally:
+        shutil.rmtree(staging_dir)
 
-def upload_backup():
+def libarchive_backup(out, changed, deleted):
     """
-    Upload the backup zip file to a remote FTP server and manage old backups.
+    Write the backup with libarchive, in the format selected by `archive_format`.
     
-    - Connects to the FTP server using the provided credentials.
-    - Uploads the generated zip file to the specified remote directory.
-    - Deletes old backups from the FTP server based on the `keep_days` setting.
+    - Site files are read, compressed and written by libarchive's C code; Python only passes
+      it the file names, so there is no per-entry zipfile overhead on sites with many small files.
+    - Zip files are deflated at level 1; tar files are compressed with zstd on every CPU core.
+    - Uses the same 'site_data/' and 'database/' layout as `zip_backup()` and `tar_backup()`.
+    - The gzipped SQL dump is staged in a temporary directory first, because libarchive needs
+      to know the size of every entry before writing it.
+    
+    :param out: Writable binary file object for the archive, which need not be seekable.
+    :param changed: List of (path, zipfile.ZipInfo) tuples for the site files to add.
+    :param deleted: List of site file arcnames removed since the previous backup.
     """
-    date_str = datetime.now().strftime('%Y%m%d')
-    zip_file = os.path.join(backup_directory, f'wordpress_backup_{date_str}.zip')
+    if libarchive is None:
+        raise RuntimeError("use_libarchive requires the libarchive-c package.")
+    if archive_format == 'tar.zst':
+        format_name, filter_name, options = 'pax_restricted', 'zstd', f'zstd:threads={os.cpu_count() or 1}'
+    else:
+        format_name, filter_name, options = 'zip', None, 'zip:compression-level=1'
+    
+    staging_dir = tempfile.mkdtemp(dir=backup_directory)
+    try:
+        dump_file = os.path.join(staging_dir, 'database_backup.sql.gz')
+        with open(dump_file, 'wb') as f:
+            dump_database(f)
+        
+        with libarchive.custom_writer(out.write, format_name, filter_name, options=options) as archive:
+            for path, zinfo in changed:
+                archive.add_files(path, pathname=zinfo.filename, recursive=False)
+            if deleted:
+                data = ('\n'.join(deleted) + '\n').encode()
+                archive.add_file_from_memory('deleted_files.txt', len(data), data)
+            archive.add_files(dump_file, pathname='database/database_backup.sql.gz', recursive=False)
+        log_message(f"Backup archived successfully: {out.name}")
+    finally:
+        shutil.rmtree(staging_dir)
 
+def backup_site(previous_manifest=None):
+    """
+    Backup the WordPress site files and MySQL database into a single archive.
+    
+    - Hashes every site file for the backup manifest, while compressing it for full zip backups.
+    - Files whose modification time and size are unchanged since the previous backup are not re-hashed.
+    - Between full backups, only files that changed since the previous backup are added, to a
+      'wordpress_backup_YYYYMMDD_HHMMSS.delta' archive listing removed files in 'deleted_files.txt'.
+    - Writes the archive with `zip_backup()` or `tar_backup()` depending on `archive_format`,
+      or with `libarchive_backup()` when `use_libarchive` is set.
+    - With the `pipeline` FTP option, the archive is uploaded to the FTP server while it is written.
+    - The archive is created in the specified backup directory with a timestamped filename.
+    
+    :param previous_manifest: Manifest of the previous backup, or None to make a full backup.
+    :return: Tuple of the archive path and the manifest describing this backup.
+    """
+    log_message("Starting backup process.")
+    
+    now = datetime.now()
+    date_str = now.strftime('%Y%m%d')
+    extension = BACKUP_EXTENSIONS[archive_format]
+    full_backup = (previous_manifest is None or ftp_config.get('full_backup_days', 0) <= 0
+                   or (datetime.strptime(date_str, '%Y%m%d')
+                       - datetime.strptime(previous_manifest['full_backup'], '%Y%m%d')).days
+                   >= ftp_config['full_backup_days'])
+    if full_backup:
+        backup_file = os.path.join(backup_directory, f'wordpress_backup_{date_str}{extension}')
+        previous_files = {}
+    else:
+        # Each delta only holds the changes since the previous run, so deltas made on the same
+        # day must not overwrite each other.
+        backup_file = os.path.join(backup_directory,
+                                   f'wordpress_backup_{date_str}_{now.strftime("%H%M%S")}.delta{extension}')
+        previous_files = previous_manifest['files']
+
+    # Forked workers would inherit any upload socket open when they start, which stops the
+    # server from seeing the end of a pipelined upload, so they are started without fork.
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        mp_context = multiprocessing.get_context('forkserver')
+    else:
+        mp_context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(mp_context=mp_context) as pool:
+        # Arcnames are sliced off the scanned paths rather than computed with relpath.
+        entries = []
+        append = entries.append
+        manifest_stats = {}
+        base_len = len(wp_directory.rstrip(os.sep)) + 1
+        for path, st in _scan_files(wp_directory):
+            arcname = 'site_data/' + path[base_len:]
+            append((path, _zipinfo_from_stat(arcname, st)))
+            manifest_stats[arcname] = [st.st_mtime_ns, st.st_size]
+        
+        if full_backup and archive_format == 'zip' and not use_libarchive:
+            # Every file goes into a full zip backup, and the zip writer hashes files as it
+            # compresses them, so there is no separate hashing pass over the site.
+            manifest_files = None
+            changed = entries
+            deleted = []
+        else:
+            # Files whose modification time and size match the previous manifest keep their
+            # recorded hash; only the rest are read and hashed.
+            known_files = previous_manifest['files'] if previous_manifest else {}
+            known_stats = previous_manifest.get('stats', {}) if previous_manifest else {}
+            manifest_files = {}
+            to_hash = []
+            for path, zinfo in entries:
+                if zinfo.filename in known_files and known_stats.get(zinfo.filename) == manifest_stats[zinfo.filename]:
+                    manifest_files[zinfo.filename] = known_files[zinfo.filename]
+                else:
+                    to_hash.append(path)
+            hashes = pool.map(_hash_file, to_hash, chunksize=64)
+            for path, digest in zip(to_hash, hashes):
+                manifest_files['site_data/' + path[base_len:]] = digest
+            
+            # Keep only the files that differ from the previous backup.
+            changed = [(path, zinfo) for path, zinfo in entries
+                       if previous_files.get(zinfo.filename) != manifest_files[zinfo.filename]]
+            deleted = sorted(set(previous_files) - set(manifest_files))
+        
+        if full_backup:
+            log_message(f"Full backup: {len(changed)} WordPress files.")
+        else:
+            log_message(f"Incremental backup: {len(changed)} changed and {len(deleted)} deleted WordPress files.")
+        
+        if ftp_config.get('pipeline'):
+            out = _UploadPipe(backup_file)
+        else:
+            out = open(backup_file, 'wb')
+        with out:
+            if use_libarchive:
+                libarchive_backup(out, changed, deleted)
+            elif archive_format == 'tar.zst':
+                tar_backup(out, changed, deleted)
+            else:
+                digests = zip_backup(out, changed, deleted, pool)
+                if manifest_files is None:
+                    manifest_files = digests
+    
+    manifest = {
+        'full_backup': date_str if full_backup else previous_manifest['full_backup'],
+        'files': manifest_files,
+        'stats': manifest_stats
+    }
+    return backup_file, manifest
+
+def _connect_ftp():
+    """
+    Open a connection to the FTP server and change to the remote backup directory.
+    
+    :return: Logged in ftplib.FTP connection.
+    """
     ftp = FTP(ftp_config['host'])
     ftp.login(ftp_config['user'], ftp_config['password'])
     ftp.cwd(ftp_config['remote_dir'])
+    return ftp
+
+def _connect_sftp():
+    """
+    Open an SFTP session to the backup server and change to the remote backup directory.
     
-    # Upload the current backup
-    with open(zip_file, 'rb') as f:
-        ftp.storbinary(f"STOR {os.path.basename(zip_file)}", f)
-    log_message(f"Backup uploaded to FTP server: {os.path.basename(zip_file)}")
+    - The server's host key must match the `host_key` FTP option ('<key type> <base64 key>', as in
+      a known_hosts line without the host name), or else an entry in '~/.ssh/known_hosts'.
+      The password is only sent once the key has been verified.
     
-    # Delete old backups from FTP if configured
-    if ftp_config['keep_days'] > 0:
-        cutoff_date = datetime.now() - timedelta(days=ftp_config['keep_days'])
-        for filename in ftp.nlst():
-            if filename.startswith('wordpress_backup_') and filename.endswith('.zip'):
-                file_date_str = filename.split('_')[2].split('.')[0]
+    :return: paramiko.SFTPClient; close it with `_close_sftp()`.
+    """
+    if paramiko is None:
+        raise RuntimeError("The 'sftp' protocol requires the paramiko package.")
+    host = ftp_config['host']
+    port = ftp_config.get('port', 22)
+    transport = paramiko.Transport((host, port),
+                                   default_window_size=SFTP_WINDOW_SIZE,
+                                   default_max_packet_size=SFTP_MAX_PACKET_SIZE)
+    try:
+        transport.start_client()
+        server_key = transport.get_remote_server_key()
+        if ftp_config.get('host_key'):
+            trusted = ftp_config['host_key'].split()[:2] == [server_key.get_name(), server_key.get_base64()]
+        else:
+            known_hosts = os.path.expanduser('~/.ssh/known_hosts')
+            host_keys = paramiko.HostKeys(known_hosts) if os.path.exists(known_hosts) else paramiko.HostKeys()
+            trusted = host_keys.check(host if port == 22 else f'[{host}]:{port}', server_key)
+        if not trusted:
+            raise paramiko.SSHException(f"Host key of SFTP server {host} is not trusted: "
+                                        f"{server_key.get_name()} {server_key.get_base64()}")
+        transport.auth_password(ftp_config['user'], ftp_config['password'])
+        sftp = paramiko.SFTPClient.from_transport(transport)
+        sftp.chdir(ftp_config['remote_dir'])
+    except Exception:
+        transport.close()
+        raise
+    return sftp
+
+def _close_sftp(sftp):
+    """
+    Close an SFTP session and the SSH connection underneath it.
+    
+    :param sftp: paramiko.SFTPClient opened with `_connect_sftp()`.
+    """
+    transport = sftp.get_channel().get_transport()
+    sftp.close()
+    transport.close()
+
+def _tune_data_connection(conn):
+    """
+    Set the socket options used for FTP data connections.
+    
+    - Disables Nagle's algorithm so the last block of an upload is not held back.
+    - Sets the send buffer to the `send_buffer_size` FTP option, if given. On Linux this turns
+      off send buffer autotuning and is capped at `net.core.wmem_max`, so it only helps when
+      that limit has been raised above the autotuning maximum in `net.ipv4.tcp_wmem`.
+    
+    :param conn: Data connection socket returned by `ftplib.FTP.transfercmd()`.
+    """
+    conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    if ftp_config.get('send_buffer_size'):
+        conn.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, ftp_config['send_buffer_size'])
+
+def _store_file(ftp, path, remote_name, offset=0, count=None):
+    """
+    Upload a local file, or a byte range of it, to the current directory on the FTP server.
+    
+    - Sends the file with `socket.sendfile()`, so on plain FTP the kernel copies it straight
+      from the page cache to the data connection without passing through Python.
+    - TLS data connections cannot use sendfile(2), so they are written in `FTP_BLOCKSIZE` blocks.
+    
+    :param ftp: Logged in ftplib.FTP connection.
+    :param path: Path of the local file to upload.
+    :param remote_name: File name to store the upload as on the FTP server.
+    :param offset: Position in the local file to start uploading from.
+    :param count: Number of bytes to upload, or None to upload to the end of the file.
+    """
+    ftp.voidcmd('TYPE I')
+    with open(path, 'rb') as f:
+        with ftp.transfercmd(f"STOR {remote_name}") as conn:
+            _tune_data_connection(conn)
+            if isinstance(conn, ssl.SSLSocket):
+                f.seek(offset)
+                remaining = count
+                while remaining is None or remaining > 0:
+                    buf = f.read(FTP_BLOCKSIZE if remaining is None else min(FTP_BLOCKSIZE, remaining))
+                    if not buf:
+                        break
+                    conn.sendall(buf)
+                    if remaining is not None:
+                        remaining -= len(buf)
+                conn.unwrap()
+            else:
+                conn.sendfile(f, offset, count)
+    return ftp.voidresp()
+
+def _remove_partial_uploads(filenames):
+    """
+    Delete partial uploads from the FTP server over a new connection.
+    
+    - Errors are only logged, so they do not hide the error that stopped the upload.
+    
+    :param filenames: Temporary names the uploads were stored under; missing files are skipped.
+    """
+    try:
+        ftp = _connect_ftp()
+        try:
+            for filename in filenames:
                 try:
-                    file_date = datetime.strptime(file_date_str, '%Y%m%d')
-                    if file_date < cutoff_date:
-                        ftp.delete(filename)
-                        log_message(f"Deleted old backup from FTP: {filename}")
-                except ValueError:
-                    log_message(f"Skipped FTP file with invalid date format: {filename}")
+                    ftp.delete(filename)
+                except error_perm:
+                    pass  # The upload never started.
+        finally:
+            ftp.quit()
+    except Exception as e:
+        log_message(f"Error deleting partial upload from FTP server: {e}")
+
+def _upload_part(path, remote_name, offset, count):
+    """
+    Upload one part of a backup over its own FTP connection.
+    
+    :param path: Path of the local backup file.
+    :param remote_name: File name to store the part as on the FTP server.
+    :param offset: Position in the local file where the part starts.
+    :param count: Size of the part in bytes.
+    """
+    ftp = _connect_ftp()
+    try:
+        _store_file(ftp, path, remote_name, offset, count)
+    finally:
+        ftp.quit()
+
+class _UploadPipe:
+    """
+    Write-only file object that saves a backup locally while uploading it to the FTP server.
+    
+    - Data is written to the local file and queued in `FTP_BLOCKSIZE` blocks for a background
+      thread that sends them over a single FTP data connection or SFTP file.
+    - The queue holds at most `PIPELINE_QUEUE_SIZE` blocks, so a slow upload holds back the writer.
+    - The upload is stored under a temporary name and renamed to the backup's name only once it
+      is complete, so an interrupted upload never looks like a finished backup.
+    - The object is not seekable, so `zipfile` writes a streamed zip with data descriptors.
+    """
+    
+    def __init__(self, path):
+        """
+        :param path: Path of the local backup file; the upload is stored under its base name.
+        """
+        self.name = path
+        self._file = open(path, 'wb')
+        self._buffer = bytearray()
+        self._position = 0
+        self._queue = queue.Queue(maxsize=PIPELINE_QUEUE_SIZE)
+        self._error = None
+        self._finished = False
+        self._server = 'SFTP' if ftp_config.get('protocol') == 'sftp' else 'FTP'
+        self._thread = threading.Thread(target=self._upload, daemon=True)
+        self._thread.start()
+    
+    def _next_block(self):
+        """
+        Wait for the next block queued by the writer.
+        
+        - The writer queues an empty block to complete the upload, or None to abort it.
+        
+        :return: Block of data, or None once the writer has closed the pipe.
+        """
+        block = self._queue.get()
+        if block is None:
+            self._finished = True
+            raise RuntimeError("Backup upload aborted.")
+        if not block:
+            self._finished = True
+            return None
+        return block
+    
+    def _send_blocks(self, block, send):
+        """
+        Pass blocks to `send` until the writer closes or aborts the pipe.
+        
+        :param block: First block of data, already taken from the queue.
+        :param send: Callable that uploads one block of data.
+        """
+        while block is not None:
+            send(block)
+            block = self._next_block()
+    
+    def _upload(self):
+        """
+        Upload the queued blocks to the backup server in the background thread.
+        
+        - Nothing is sent until the first block is queued, so neither the connection nor the data
+          transfer sits idle on the server while the database is dumped for a tar backup.
+        - An aborted or failed upload is removed from the server.
+        """
+        remote_name = os.path.basename(self.name)
+        temp_name = remote_name + UPLOAD_TEMP_SUFFIX
+        started = False
+        try:
+            block = self._next_block()
+            if self._server == 'SFTP':
+                sftp = _connect_sftp()
+                try:
+                    started = True
+                    with sftp.open(temp_name, 'wb') as remote:
+                        remote.set_pipelined(True)
+                        self._send_blocks(block, remote.write)
+                    sftp.posix_rename(temp_name, remote_name)
+                finally:
+                    _close_sftp(sftp)
+            else:
+                ftp = _connect_ftp()
+                try:
+                    ftp.voidcmd('TYPE I')
+                    started = True
+                    with ftp.transfercmd(f"STOR {temp_name}") as conn:
+                        _tune_data_connection(conn)
+                        try:
+                            self._send_blocks(block, conn.sendall)
+                        except Exception:
+                            # Closing the data connection is what completes a STOR, so the
+                            # server is told the transfer is abandoned first.
+                            ftp.putcmd('ABOR')
+                            raise
+                        if isinstance(conn, ssl.SSLSocket):
+                            conn.unwrap()
+                    ftp.voidresp()
+                    ftp.rename(temp_name, remote_name)
+                    ftp.quit()
+                finally:
+                    ftp.close()
+        except Exception as e:
+            self._error = e
+            # Keep draining so the writer never blocks on a full queue.
+            while not self._finished:
+                self._finished = not self._queue.get()
+            if started:
+                self._remove_partial(temp_name)
+    
+    def _remove_partial(self, temp_name):
+        """
+        Delete a partial upload from the server over a new connection.
+        
+        :param temp_name: Temporary name the upload was stored under.
+        """
+        try:
+            if self._server == 'SFTP':
+                sftp = _connect_sftp()
+                try:
+                    sftp.remove(temp_name)
+                finally:
+                    _close_sftp(sftp)
+            else:
+                _remove_partial_uploads([temp_name])
+        except Exception as e:
+            log_message(f"Error deleting partial upload from {self._server} server: {temp_name}: {e}")
+    
+    def write(self, data):
+        self._file.write(data)
+        self._buffer += data
+        self._position += len(data)
+        # Large writes are queued in FTP_BLOCKSIZE slices, so the queue bounds memory use
+        # whatever size the archive writer writes in.
+        if len(self._buffer) >= FTP_BLOCKSIZE:
+            end = len(self._buffer) - len(self._buffer) % FTP_BLOCKSIZE
+            with memoryview(self._buffer) as view:
+                for start in range(0, end, FTP_BLOCKSIZE):
+                    self._queue.put(bytes(view[start:start + FTP_BLOCKSIZE]))
+            del self._buffer[:end]
+        return len(data)
+    
+    def tell(self):
+        return self._position
+    
+    def flush(self):
+        self._file.flush()
+    
+    def close(self, abort=False):
+        """
+        Finish the local file and wait for the upload to complete.
+        
+        :param abort: Abandon the upload instead of completing it, removing it from the server.
+        """
+        self._file.close()
+        if not abort and self._buffer:
+            self._queue.put(bytes(self._buffer))
+        self._queue.put(None if abort else b'')
+        self._thread.join()
+        if self._error is not None and not abort:
+            raise self._error
+        if not abort:
+            log_message(f"Backup uploaded to {self._server} server: {os.path.basename(self.name)}")
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(abort=exc_type is not None)
+
+def fetch_manifest():
+    """
+    Download the manifest of the previous backup from the FTP server.
+    
+    :return: Manifest dictionary, or None if the FTP server has no manifest yet.
+    """
+    data = io.BytesIO()
+    if ftp_config.get('protocol') == 'sftp':
+        sftp = _connect_sftp()
+        try:
+            sftp.getfo(MANIFEST_NAME, data)
+        except FileNotFoundError:
+            log_message("No backup manifest found on SFTP server, a full backup will be made.")
+            return None
+        finally:
+            _close_sftp(sftp)
+        return json.loads(data.getvalue())
+    
+    ftp = _connect_ftp()
+    try:
+        ftp.retrbinary(f"RETR {MANIFEST_NAME}", data.write)
+    except error_perm:
+        log_message("No backup manifest found on FTP server, a full backup will be made.")
+        return None
+    finally:
+        ftp.quit()
+    return json.loads(data.getvalue())
+
+def _date_from_name(filename):
+    """
+    Read the date of a backup from its 'wordpress_backup_YYYYMMDD' file name.
+    
+    :param filename: Name of the backup file.
+    :return: datetime of the backup date, or None if the name has no valid date.
+    """
+    file_date_str = filename.split('_')[2].split('.')[0]
+    try:
+        return datetime.strptime(file_date_str, '%Y%m%d')
+    except ValueError:
+        log_message(f"Skipped FTP file with invalid date format: {filename}")
+        return None
+
+def _list_backups(ftp):
+    """
+    List the backup files in the current directory on the FTP server.
+    
+    - Uses MLSD so backups are dated by the server's modification time.
+    - Falls back to NLST and the date in the file name if the server does not support MLSD,
+      and to the date in the file name for entries MLSD lists without a modification time.
+    
+    :param ftp: Logged in ftplib.FTP connection.
+    :return: List of (filename, datetime) tuples, with datetimes in local time.
+    """
+    extensions = tuple(BACKUP_EXTENSIONS.values())
+    try:
+        entries = list(ftp.mlsd())
+    except error_perm:
+        entries = None
+    
+    backups = []
+    if entries is not None:
+        for filename, facts in entries:
+            if (facts.get('type', 'file') != 'file'
+                    or not filename.startswith('wordpress_backup_') or not filename.endswith(extensions)):
+                continue
+            if 'modify' in facts:
+                # MLSD reports modification times in UTC.
+                modified = datetime.strptime(facts['modify'][:14], '%Y%m%d%H%M%S')
+                file_date = modified.replace(tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+            else:
+                file_date = _date_from_name(filename)
+            if file_date is not None:
+                backups.append((filename, file_date))
+        return backups
+    
+    for filename in ftp.nlst():
+        if filename.startswith('wordpress_backup_') and filename.endswith(extensions):
+            file_date = _date_from_name(filename)
+            if file_date is not None:
+                backups.append((filename, file_date))
+    return backups
+
+def _delete_backups(filenames):
+    """
+    Delete backup files from the FTP server over parallel connections.
+    
+    - Each worker thread opens its own FTP connection once and reuses it for all of its deletes.
+    
+    :param filenames: Names of the backup files to delete from the remote backup directory.
+    """
+    local = threading.local()
+    connections = []
+    connections_lock = threading.Lock()
+    
+    def delete(filename):
+        ftp = getattr(local, 'ftp', None)
+        if ftp is None:
+            ftp = local.ftp = _connect_ftp()
+            with connections_lock:
+                connections.append(ftp)
+        ftp.delete(filename)
+        log_message(f"Deleted old backup from FTP: {filename}")
+    
+    try:
+        with ThreadPoolExecutor(FTP_DELETE_CONNECTIONS) as pool:
+            list(pool.map(delete, filenames))
+    finally:
+        for ftp in connections:
+            ftp.quit()
+
+def _upload_backup_sftp(backup_file, manifest_file, cutoff_date):
+    """
+    Upload the backup archive and manifest over SFTP and delete old backups.
+    
+    - Backups are always sent as a single file; the large SSH window set by `_connect_sftp()`
+      takes the place of parallel connections.
+    
+    :param backup_file: Path of the backup archive to upload.
+    :param manifest_file: Path of the backup manifest to upload.
+    :param cutoff_date: Backups modified before this datetime are deleted, or None to keep all backups.
+    """
+    backup_name = os.path.basename(backup_file)
+    extensions = tuple(BACKUP_EXTENSIONS.values())
+    sftp = _connect_sftp()
+    try:
+        if not ftp_config.get('pipeline'):
+            with open(backup_file, 'rb') as f:
+                sftp.putfo(f, backup_name, file_size=os.path.getsize(backup_file))
+            log_message(f"Backup uploaded to SFTP server: {backup_name}")
+        
+        sftp.put(manifest_file, MANIFEST_NAME)
+        log_message("Backup manifest uploaded to SFTP server.")
+        
+        if cutoff_date is not None:
+            for attr in sftp.listdir_attr():
+                filename = attr.filename
+                if (filename.startswith('wordpress_backup_') and filename.endswith(extensions)
+                        and datetime.fromtimestamp(attr.st_mtime) < cutoff_date):
+                    sftp.remove(filename)
+                    log_message(f"Deleted old backup from SFTP: {filename}")
+    finally:
+        _close_sftp(sftp)
+
+def upload_backup(backup_file, manifest):
+    """
+    Upload the backup archive to a remote FTP server and manage old backups.
+    
+    - Connects to the FTP server using the provided credentials.
+    - Uploads the generated archive to the specified remote directory, unless it was already
+      uploaded while being written with the `pipeline` option.
+    - Large backups are split into parts uploaded over `streams` parallel connections, named
+      'wordpress_backup_YYYYMMDD.partNN.zip'; concatenate the parts in order to restore the archive.
+      Parts are uploaded under temporary names and renamed once all of them are stored, and any
+      parts left by an earlier upload of the same backup are deleted first.
+    - Uploads the backup manifest once the archive is stored, so the next run can back up only changed files.
+    - Deletes old backups from the FTP server based on the `keep_days` setting, never removing the
+      latest full backup that newer incremental backups depend on.
+    - With the 'sftp' protocol, uploads over SFTP instead using `_upload_backup_sftp()`.
+    
+    :param backup_file: Path of the backup archive to upload.
+    :param manifest: Manifest describing the backup.
+    """
+    manifest_file = os.path.join(backup_directory, MANIFEST_NAME)
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f)
+    
+    cutoff_date = None
+    if ftp_config['keep_days'] > 0:
+        cutoff_date = min(datetime.now() - timedelta(days=ftp_config['keep_days']),
+                          datetime.strptime(manifest['full_backup'], '%Y%m%d'))
+    
+    if ftp_config.get('protocol') == 'sftp':
+        _upload_backup_sftp(backup_file, manifest_file, cutoff_date)
+        return
+    
+    # Upload the current backup, split across parallel connections if it is large enough.
+    backup_name = os.path.basename(backup_file)
+    backup_size = os.path.getsize(backup_file)
+    extension = BACKUP_EXTENSIONS[archive_format]
+    part_prefix = f'{backup_name[:-len(extension)]}.part'
+    streams = max(1, min(ftp_config.get('streams', 1), backup_size // FTP_MIN_PART_SIZE))
+    if ftp_config.get('pipeline'):
+        # The backup was already uploaded while it was being written.
+        streams = 0
+    elif streams > 1:
+        part_size = -(-backup_size // streams)
+        part_names = [f'{part_prefix}{i:02d}{extension}' for i in range(streams)]
+        parts = [(backup_file, part_names[i] + UPLOAD_TEMP_SUFFIX, i * part_size,
+                  min(part_size, backup_size - i * part_size)) for i in range(streams)]
+        try:
+            with ThreadPoolExecutor(streams) as pool:
+                list(pool.map(lambda part: _upload_part(*part), parts))
+        except Exception:
+            _remove_partial_uploads([part[1] for part in parts])
+            raise
+    
+    # Connect only once the parts are uploaded so the control connection does not sit idle.
+    ftp = _connect_ftp()
+    
+    # Parts of an earlier, larger upload of this backup would otherwise be concatenated into
+    # the restored archive.
+    for filename, file_date in _list_backups(ftp):
+        if filename.startswith(part_prefix) and filename[len(part_prefix):-len(extension)].isdigit():
+            ftp.delete(filename)
+            log_message(f"Deleted stale backup part from FTP: {filename}")
+    
+    if streams > 1:
+        for part_name in part_names:
+            ftp.rename(part_name + UPLOAD_TEMP_SUFFIX, part_name)
+        log_message(f"Backup uploaded to FTP server in {streams} parts: {backup_name}")
+    elif streams == 1:
+        _store_file(ftp, backup_file, backup_name)
+        log_message(f"Backup uploaded to FTP server: {backup_name}")
+    
+    _store_file(ftp, manifest_file, MANIFEST_NAME)
+    log_message("Backup manifest uploaded to FTP server.")
+    
+    # Delete old backups from FTP if configured
+    if cutoff_date is not None:
+        to_delete = [filename for filename, file_date in _list_backups(ftp) if file_date < cutoff_date]
+        if len(to_delete) > FTP_DELETE_CONNECTIONS:
+            _delete_backups(to_delete)
+        else:
+            for filename in to_delete:
+                ftp.delete(filename)
+                log_message(f"Deleted old backup from FTP: {filename}")
 
     ftp.quit()
 
@@ -182,16 +1209,19 @@ def main():
     
     - Logs the start of the backup process.
     - Deletes yesterday's local backup.
-    - Backs up the WordPress site files and database.
-    - Compresses the backup into a zip file.
-    - Uploads the zip file to a remote FTP server.
+    - Fetches the manifest of the previous backup from the FTP server.
+    - Backs up the WordPress site files and database into an archive, full or incremental.
+    - Uploads the archive to a remote FTP server.
     - Manages old backups on the FTP server.
+    - Drops the local archive from the page cache once it has been uploaded.
     """
     log_message("Backup script initiated.")
     delete_yesterdays_backup()
-    backup_site()
-    zip_backup()
-    upload_backup()
+    previous_manifest = fetch_manifest()
+    backup_file, manifest = backup_site(previous_manifest)
+    upload_backup(backup_file, manifest)
+    with open(backup_file, 'rb') as f:
+        _drop_cache(f)
     log_message("Backup process completed.")
 
 if __name__ == "__main__":